@@ -0,0 +1,372 @@
+"""
+Reagent plate fill map and deck manifest for PASTA_oligoHRP_automation.py.
+
+Evaluates the layout logic of the automation script for its current run
+parameters (wellslist, PASTA_cycles, Tyr_dilution_lib, hydration_time) and
+writes the required volume of every reagent plate and reservoir well:
+
+- deck_manifest.csv: one row per well to fill
+- deck_map.png: rendered 96-well plate and 12-well reservoir maps
+
+The automation script is read without the Opentrons API, so the manifest can
+be regenerated for every experiment right after editing the run parameters.
+
+Usage
+-----
+    python automation/PASTA_deck_manifest.py
+    python automation/PASTA_deck_manifest.py --protocol my_run.py --output-dir ./output/manifest
+"""
+
+import argparse
+import ast
+import csv
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+
+#################### FIXED MANIFEST PARAMETERS #########################
+
+DEFAULT_PROTOCOL = Path(__file__).parent / "PASTA_oligoHRP_automation.py"
+
+# 220 ul HRP-oligo in azide-free Plate Buffer at 200 nM (2 x 100 ul applied)
+HRP_oligo_volume = 220
+
+# Nominal volume of a celltreat_12_reservoir_15000ul well
+reservoir_well_capacity = 15000
+
+MANIFEST_COLUMNS = ["labware", "slot", "well", "reagent", "sample", "cycles", "volume_ul"]
+
+REAGENT_COLORS = {
+    "HRP-oligo": "#66BB6A",
+    "Tyramide oligo": "#FFF176",
+    "TSA Buffer": "#6F9BD8",
+    "Azide-free 1X CODEX Buffer": "#DCEAF7",
+    "1X CODEX Buffer": "#64B5F6",
+    "Azide-free 1X Stripping Buffer": "#E19C9C",
+    "Stripping Buffer": "#F5D6EC",
+    "1X TBS": "#F5F3D7",
+}
+
+
+####################! FUNCTIONS #########################
+
+def load_protocol(path):
+    """
+    Evaluate the module level of an OT-2 protocol without the Opentrons API.
+
+    The `opentrons` imports and the `run` function are dropped, everything else
+    (run parameters, layout variables and helper functions) is executed.
+
+    Parameters
+    ----------
+    path : str or Path
+        Path to the protocol script.
+
+    Returns
+    -------
+    SimpleNamespace
+        Module-level names of the protocol.
+    """
+    path = Path(path)
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+
+    def uses_opentrons(node):
+        if isinstance(node, ast.ImportFrom):
+            return (node.module or "").split(".")[0] == "opentrons"
+        if isinstance(node, ast.Import):
+            return any(alias.name.split(".")[0] == "opentrons" for alias in node.names)
+        return isinstance(node, ast.FunctionDef) and node.name == "run"
+
+    tree.body = [node for node in tree.body if not uses_opentrons(node)]
+
+    namespace = {"__name__": "pasta_protocol", "__file__": str(path)}
+    exec(compile(tree, str(path), "exec"), namespace)
+
+    return SimpleNamespace(**namespace)
+
+
+def format_cycles(cycles):
+    """Format sorted 1-based cycle numbers as ranges, e.g. [1, 2, 3, 5] -> '1-3, 5'."""
+    ranges = []
+    for cycle in cycles:
+        if ranges and cycle == ranges[-1][1] + 1:
+            ranges[-1][1] = cycle
+        else:
+            ranges.append([cycle, cycle])
+
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def build_manifest(pr):
+    """
+    Compute the fill manifest of the reagent plate and the buffer reservoirs.
+
+    Parameters
+    ----------
+    pr : SimpleNamespace
+        Protocol namespace, see `load_protocol`.
+
+    Returns
+    -------
+    rows : list of dict
+        Manifest rows with the keys of `MANIFEST_COLUMNS`.
+    warnings : list of str
+        Configuration problems found while building the manifest, such as
+        more cycles than supported or wells used twice.
+    """
+    warnings = []
+    sample_cycles = pr.get_sample_cycles(pr.wellslist, pr.Tyr_dilution_lib, pr.PASTA_cycles)
+    total_cycles = max(sample_cycles.values())
+
+    max_cycles = {1: 32, 2: 16, 3: 8, 4: 8}.get(pr.num_samples, 0)
+    if total_cycles > max_cycles:
+        warnings.append(f"{pr.num_samples} samples support at most {max_cycles} cycles, configured: {total_cycles}")
+    for well, n_cycles in sample_cycles.items():
+        if n_cycles == 0:
+            warnings.append(f"Sample {well} has no Tyr_dilution_lib entry for cycle 1")
+
+    rows = []
+    plate = ("Reagent plate (parhelia_black_96)", pr.labwarePositions.reagent_plate)
+    reservoir_CODEX = ("CODEX reservoir (12-well)", pr.labwarePositions.buffers_reservoir_1)
+    reservoir_Other = ("Other reservoir (12-well)", pr.labwarePositions.buffers_reservoir_2)
+
+    ## Reagent plate
+    for sample, well in enumerate(pr.wellslist):
+        for cycle in range(sample_cycles[well]):
+            dilution_factor = pr.Tyr_dilution_lib[cycle + 1][well]
+            HRP_well, Tyr_well, Diluent_well = pr.get_reagent_wells(sample, cycle)
+            for plate_well, reagent, volume in [
+                (HRP_well, "HRP-oligo", HRP_oligo_volume),
+                (Tyr_well, "Tyramide oligo", pr.TSA_volume / dilution_factor),
+                (Diluent_well, "TSA Buffer", pr.TSA_volume),
+            ]:
+                rows.append({
+                    "labware": plate[0], "slot": plate[1], "well": plate_well, "reagent": reagent,
+                    "sample": well, "cycles": str(cycle + 1), "volume_ul": volume,
+                })
+
+    ## Cycle buffers
+    workload = pr.get_cycle_workload(sample_cycles, total_cycles)
+    try:
+        config = pr.create_cycle_config(workload)
+    except IndexError:
+        warnings.append(f"Not enough CODEX/Strip reservoir wells for {total_cycles} cycles, cycle buffers are not listed")
+        config = {}
+
+    reservoir_volumes = defaultdict(float)
+    reservoir_cycles = defaultdict(list)
+    rinse_volume = 0
+    current = {}
+    for cycle in range(total_cycles if config else 0):
+        for buffer_name in ("CODEX", "Strip", "TBS"):
+            if buffer_name in config[cycle]:
+                current[buffer_name] = config[cycle][buffer_name]
+        for buffer_name, volume in pr.get_cycle_buffer_volumes(workload[cycle]).items():
+            if buffer_name == "Hydration":
+                rinse_volume += volume
+                continue
+            key = (buffer_name, current[buffer_name])
+            reservoir_volumes[key] += volume
+            reservoir_cycles[key].append(cycle + 1)
+
+    # The protocol reads CODEX and TBS from the CODEX reservoir, Strip from the other reservoir
+    cycle_buffers = {
+        "CODEX": (reservoir_CODEX, "Azide-free 1X CODEX Buffer"),
+        "Strip": (reservoir_Other, "Azide-free 1X Stripping Buffer"),
+        "TBS": (reservoir_CODEX, "1X TBS"),
+    }
+    for (buffer_name, reservoir_well), volume in reservoir_volumes.items():
+        reservoir, reagent = cycle_buffers[buffer_name]
+        rows.append({
+            "labware": reservoir[0], "slot": reservoir[1], "well": reservoir_well, "reagent": reagent,
+            "sample": "", "cycles": format_cycles(reservoir_cycles[(buffer_name, reservoir_well)]),
+            "volume_ul": volume,
+        })
+
+    ## Final strip of every sample, after its last cycle
+    n_stripped = sum(1 for n in sample_cycles.values() if n > 0)
+    rows.append({
+        "labware": reservoir_Other[0], "slot": reservoir_Other[1], "well": pr.FINAL_STRIP_BUFFERS["Strip"],
+        "reagent": "Stripping Buffer", "sample": "", "cycles": "final strip",
+        "volume_ul": n_stripped * pr.strip_Strip_volume,
+    })
+    rows.append({
+        "labware": reservoir_Other[0], "slot": reservoir_Other[1], "well": pr.FINAL_STRIP_BUFFERS["CODEX"],
+        "reagent": "1X CODEX Buffer", "sample": "", "cycles": "final strip",
+        "volume_ul": n_stripped * pr.strip_CODEX_volume,
+    })
+
+    ## Rinses of finished samples during the run, from the first hydration well
+    n_final = sum(1 for n in sample_cycles.values() if n == total_cycles)
+    n_early = sum(1 for n in sample_cycles.values() if 0 < n < total_cycles)
+    if n_early:
+        rinse_volume += (n_early * pr.hydration_volume
+                         * pr.get_hydration_rinses(pr.get_strip_seconds(n_final), n_early))
+
+    ## Hydration (one rinse per sample every 15 minutes)
+    hydration_volumes = defaultdict(float)
+    hydration_hours = defaultdict(list)
+    if rinse_volume:
+        hydration_volumes[pr.HYDRATION_BUFFERS[0]] += rinse_volume
+    for i in range(pr.hydration_time * 4):
+        cycle_hour = i // 4
+        start_hour = max(hour for hour in pr.HYDRATION_BUFFERS if hour <= cycle_hour)
+        hydration_volumes[pr.HYDRATION_BUFFERS[start_hour]] += pr.num_samples * pr.hydration_volume
+        if cycle_hour not in hydration_hours[pr.HYDRATION_BUFFERS[start_hour]]:
+            hydration_hours[pr.HYDRATION_BUFFERS[start_hour]].append(cycle_hour)
+
+    for reservoir_well, volume in hydration_volumes.items():
+        hours = hydration_hours[reservoir_well]
+        uses = [f"hydration hours {hours[0]}-{hours[-1] + 1}"] if hours else []
+        if reservoir_well == pr.HYDRATION_BUFFERS[0] and rinse_volume:
+            uses.insert(0, "rinses during run")
+        rows.append({
+            "labware": reservoir_CODEX[0], "slot": reservoir_CODEX[1], "well": reservoir_well,
+            "reagent": "1X CODEX Buffer", "sample": "", "cycles": ", ".join(uses),
+            "volume_ul": volume,
+        })
+
+    ## Wells claimed more than once
+    claimed = defaultdict(list)
+    for row in rows:
+        claimed[(row["labware"], row["well"])].append(f"{row['reagent']} ({row['sample'] or row['cycles']})")
+    for (labware, well), uses in claimed.items():
+        if len(uses) > 1:
+            warnings.append(f"{labware} well {well} is used for {' and '.join(uses)}")
+
+    ## Reservoir wells filled beyond their capacity
+    for row in rows:
+        if row["labware"] != plate[0] and row["volume_ul"] > reservoir_well_capacity:
+            warnings.append(f"{row['labware']} well {row['well']} needs {row['volume_ul'] / 1000:.1f} ml "
+                            f"of {row['reagent']}, more than the {reservoir_well_capacity / 1000:.0f} ml it holds")
+
+    return rows, warnings
+
+
+def write_manifest(rows, path):
+    """Write the manifest rows as CSV."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({**row, "volume_ul": round(row["volume_ul"], 1)})
+
+
+def plot_manifest(rows, pr, path):
+    """
+    Render the 96-well reagent plate and both 12-well reservoirs with their fill volumes.
+
+    Parameters
+    ----------
+    rows : list of dict
+        Manifest rows, see `build_manifest`.
+    pr : SimpleNamespace
+        Protocol namespace, see `load_protocol`.
+    path : str or Path
+        Path of the rendered image.
+
+    Returns
+    -------
+    bool
+        False if matplotlib is not installed and no image was written.
+    """
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import Circle, Patch, Rectangle
+    except ImportError:
+        print("matplotlib is not installed, skipping the deck map (use --no-plot to only write the CSV manifest)")
+        return False
+
+    fig = plt.figure(figsize=(16, 11))
+    ax_plate = fig.add_axes([0.05, 0.42, 0.9, 0.55])
+    ax_CODEX = fig.add_axes([0.05, 0.05, 0.42, 0.3])
+    ax_Other = fig.add_axes([0.53, 0.05, 0.42, 0.3])
+
+    by_labware = defaultdict(dict)
+    for row in rows:
+        by_labware[row["slot"]].setdefault(row["well"], []).append(row)
+
+    ## 96-well plate
+    plate_wells = by_labware[pr.labwarePositions.reagent_plate]
+    for r, row_name in enumerate("ABCDEFGH"):
+        ax_plate.text(-0.8, r, row_name, ha="center", va="center", fontsize=12)
+        for c in range(12):
+            if r == 0:
+                ax_plate.text(c, -0.8, str(c + 1), ha="center", va="center", fontsize=12)
+            entries = plate_wells.get(f"{row_name}{c + 1}", [])
+            color = REAGENT_COLORS[entries[0]["reagent"]] if entries else "white"
+            ax_plate.add_patch(Circle((c, r), 0.42, facecolor=color, edgecolor="black", linewidth=0.8))
+            if entries:
+                entry = entries[0]
+                ax_plate.text(c, r, f"{entry['sample']} c{entry['cycles']}\n{entry['volume_ul']:.4g} µl",
+                              ha="center", va="center", fontsize=7)
+
+    ax_plate.set_xlim(-1.3, 11.6)
+    ax_plate.set_ylim(8.6 - 1, -1.3)
+    ax_plate.set_aspect("equal")
+    ax_plate.axis("off")
+    ax_plate.set_title(f"Reagent plate (slot {pr.labwarePositions.reagent_plate}) - samples {', '.join(pr.wellslist)}",
+                       loc="left", fontsize=14, fontweight="bold")
+    ax_plate.legend(handles=[Patch(facecolor=REAGENT_COLORS[name], edgecolor="black", label=name)
+                             for name in ("HRP-oligo", "Tyramide oligo", "TSA Buffer")],
+                    loc="lower center", bbox_to_anchor=(0.5, -0.08), ncol=3, frameon=False)
+
+    ## 12-well reservoirs
+    for ax, slot, title in [
+        (ax_CODEX, pr.labwarePositions.buffers_reservoir_1, "CODEX reservoir"),
+        (ax_Other, pr.labwarePositions.buffers_reservoir_2, "Other reservoir"),
+    ]:
+        reservoir_wells = by_labware[slot]
+        for c in range(12):
+            entries = reservoir_wells.get(f"A{c + 1}", [])
+            color = REAGENT_COLORS[entries[0]["reagent"]] if len(entries) == 1 else ("white" if not entries else "#FF5252")
+            ax.add_patch(Rectangle((c, 0), 1, 4, facecolor=color, edgecolor="black", linewidth=0.8))
+            ax.text(c + 0.5, -0.3, f"A{c + 1}", ha="center", va="center", fontsize=9)
+            for i, entry in enumerate(entries):
+                ax.text(c + 0.5, 3.5 - 1.6 * i,
+                        f"{entry['reagent']}\n{entry['volume_ul'] / 1000:.2f} ml\n{entry['cycles']}",
+                        ha="center", va="top", fontsize=6, rotation=90)
+
+        ax.set_xlim(-0.2, 12.2)
+        ax.set_ylim(-0.6, 4.2)
+        ax.axis("off")
+        ax.set_title(f"{title} (slot {slot})", loc="left", fontsize=14, fontweight="bold")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path, dpi=150)
+    plt.close(fig)
+
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the reagent plate and reservoir fill manifest of a PASTA run.")
+    parser.add_argument("--protocol", default=DEFAULT_PROTOCOL, help="Path to the configured automation script.")
+    parser.add_argument("--output-dir", default="./output/manifest", help="Directory for deck_manifest.csv and deck_map.png.")
+    parser.add_argument("--no-plot", action="store_true", help="Only write the CSV manifest.")
+    args = parser.parse_args()
+
+    pr = load_protocol(args.protocol)
+    rows, warnings = build_manifest(pr)
+
+    output_dir = Path(args.output_dir)
+    write_manifest(rows, output_dir / "deck_manifest.csv")
+    n_wells = len({(row["labware"], row["well"]) for row in rows})
+    print(f"Manifest written to {output_dir / 'deck_manifest.csv'} ({len(rows)} rows, {n_wells} wells)")
+
+    for warning in warnings:
+        print("WARNING: " + warning)
+
+    if not args.no_plot and plot_manifest(rows, pr, output_dir / "deck_map.png"):
+        print(f"Deck map written to {output_dir / 'deck_map.png'}")
+
+
+if __name__ == "__main__":
+    main()
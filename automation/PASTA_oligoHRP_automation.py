@@ -105,38 +105,63 @@ wash_volume = 200
 DMSO_volume = 200
 extra_bottom_gap=0
 
+hydration_volume = 100
+hydration_interval = 15   # Minutes between rinses of finished samples, as in the hydration mode
+hydration_margin = 3      # Rinse this many minutes early to allow for steps that take longer than estimated
+
 default_flow_rate = 30
 well_flow_rate = 5
 sample_flow_rate = 0.25
 DMSO_flow_rate = 0.1
 
+TSA_volume = 200   # Volume of diluted Tyramide oligo per sample per cycle
+
+## Buffer consumption per sample (in ul)
+strip_CODEX_volume = 6 * wash_volume                        # CODEX buffer per sample per strip
+strip_Strip_volume = 6 * DMSO_volume                        # Strip buffer per sample per strip
+cycle_CODEX_volume = strip_CODEX_volume + 8 * wash_volume   # CODEX buffer per sample per full cycle
+
+## Estimated durations (in seconds) used to time and budget the hydration of finished samples
+pipetting_seconds = 20           # Tip moves, aspiration and blow-out of one dispense
+handling_seconds = 30            # Tip change and piercing, mixing or diluting of one well
+strip_delay_seconds = 7 * 60     # Incubations of one strip
+cycle_delay_seconds = 31 * 60    # Incubations of one cycle excluding its strip
+
+## Usable volume per reservoir well before moving on to the next well (in ul)
+CODEX_well_volume = 4 * cycle_CODEX_volume                  # 4 sample-cycles per CODEX well
+Strip_well_volume = 8 * strip_Strip_volume                  # 8 sample-cycles per Strip well
+
 ## Cycle-aware logic
 
 num_samples = len(wellslist)
 
 # Define cycle logic based on number of samples
 if num_samples == 1:
-    CODEX_change_interval = 4   # New CODEX every 4 cycles
-    Strip_change_interval = 8   # New Strip every 8 cycles
     sample_spacing = 0          # Only 1 sample, no horizontal spacing
     cycle_period = 8            # Cycle period for well rotation
     cycle_offset = 3            # Move 3 columns every 8 cycles
 elif num_samples == 2:
-    CODEX_change_interval = 2
-    Strip_change_interval = 4
     sample_spacing = 6          # 6 columns between samples
     cycle_period = 8
     cycle_offset = 3
 elif num_samples in [3, 4]:
-    CODEX_change_interval = 1   # New CODEX every cycle
-    Strip_change_interval = 2   # New Strip every 2 cycles
     sample_spacing = 3          # 3 columns between samples
     cycle_period = float('inf') # Never change (use inf so division by it = 0)
     cycle_offset = 0
 
+## Reservoir wells outside the cycle configuration
+FINAL_STRIP_BUFFERS = {'CODEX': 'A8', 'Strip': 'A7'}   # Other reservoir
+
+HYDRATION_BUFFERS = {   # CODEX reservoir well by hour of hydration
+    0: 'A9',
+    6: 'A10',
+    12: 'A11',
+    18: 'A12'
+}
+
 
 ####################! FUNCTIONS - DO NOT MODIFY !######################### 
-def washSamples(pipette, sourceSolutionWell, samples, volume, num_repeats=1, disp_rate = sample_flow_rate, dispense_bottom_gap=extra_bottom_gap, keep_tip = False):
+def washSamples(pipette, sourceSolutionWell, samples, volume, num_repeats=1, disp_rate = sample_flow_rate, dispense_bottom_gap=extra_bottom_gap, keep_tip = False, between_dispenses = None):
     """
     Wash sample chambers by aspirating from a source well and dispensing into samples.
     
@@ -163,6 +188,12 @@ def washSamples(pipette, sourceSolutionWell, samples, volume, num_repeats=1, dis
     keep_tip : bool, optional
         If True, keep the tip on the pipette after completion. If False, drop tip.
         Default is False.
+    between_dispenses : callable, optional
+        Called after each dispense with its estimated duration in seconds (see
+        `get_dispense_seconds`), e.g. to hydrate other samples during long
+        washes. It may drop the tip; a new tip is picked up before the next
+        aspiration. With keep_tip=True the pipette may then end without a tip.
+        Default is None.
     
     Returns
     -------
@@ -197,11 +228,14 @@ def washSamples(pipette, sourceSolutionWell, samples, volume, num_repeats=1, dis
         for s in samples:
             print(s)
             print ("Washing sample:" + str(s))
+            if not pipette.has_tip: pipette.pick_up_tip()
             pipette.aspirate(volume, sourceSolutionWell, rate=well_flow_rate)
             pipette.dispense(volume, s.bottom(dispense_bottom_gap), rate=disp_rate)
             pipette.blow_out(sourceSolutionWell.top(-5))
 
-    if not keep_tip: pipette.drop_tip()
+            if between_dispenses is not None: between_dispenses(get_dispense_seconds(volume, disp_rate))
+
+    if not keep_tip and pipette.has_tip: pipette.drop_tip()
     
 def apply_buffer(pipette, sourceSolutionWell, samples, volume, dispense_bottom_gap=extra_bottom_gap, keep_tip = False):
     """
@@ -432,6 +466,250 @@ def validate_cycle_sample_compatibility(protocol, num_samples, num_cycles):
             f"Fix the parameters and resume."
         )
 
+def get_sample_cycles(wells, dilution_lib, max_cycles):
+    """
+    Derive the number of cycles of each sample from the Tyramide dilution library.
+
+    A sample runs every cycle from cycle 1 onwards for which it has an entry in
+    the dilution library, up to `max_cycles`. Its first missing cycle ends its run.
+
+    Parameters
+    ----------
+    wells : list of str
+        Sample positions on the OmniStainer (e.g. ['A2', 'A3']).
+    dilution_lib : dict
+        Dilution factors keyed by cycle number (1-based) and sample position.
+    max_cycles : int
+        Maximum number of cycles of the run.
+
+    Returns
+    -------
+    dict
+        Number of cycles keyed by sample position.
+
+    Examples
+    --------
+    >>> get_sample_cycles(['A2', 'A3'], {1: {'A2': 50, 'A3': 50}, 2: {'A2': 50}}, 2)
+    {'A2': 2, 'A3': 1}
+    """
+    sample_cycles = {}
+
+    for well in wells:
+        n_cycles = 0
+        while n_cycles < max_cycles and well in dilution_lib.get(n_cycles + 1, {}):
+            n_cycles += 1
+        sample_cycles[well] = n_cycles
+
+    return sample_cycles
+
+def validate_sample_cycles(protocol, sample_cycles, dilution_lib, max_cycles):
+    """Pause if a sample has no cycles or dilution entries after its last cycle"""
+    for well, n_cycles in sample_cycles.items():
+        skipped = [cycle for cycle in range(n_cycles + 2, max_cycles + 1) if well in dilution_lib.get(cycle, {})]
+
+        if n_cycles == 0 or skipped:
+            protocol.pause(
+                f"INCOMPATIBLE DILUTION LIBRARY\n\n"
+                f"Sample: {well} | Cycles run: {n_cycles}\n"
+                f"Missing entry for cycle {n_cycles + 1}"
+                + (f", ignored entries for cycles {skipped}" if skipped else "") + "\n\n"
+                f"Fix the parameters and resume."
+            )
+
+def get_reagent_wells(sample, cycle):
+    """
+    Return the reagent plate wells of a sample in a cycle.
+
+    Each cycle uses one row of the plate (A-H, repeating every 8 cycles). Samples
+    are `sample_spacing` columns apart and move on by `cycle_offset` columns
+    every `cycle_period` cycles.
+
+    Parameters
+    ----------
+    sample : int
+        Index of the sample in `wellslist`.
+    cycle : int
+        Cycle index (0-based).
+
+    Returns
+    -------
+    tuple of str
+        Names of the HRP-oligo, Tyramide oligo and diluent (TSA buffer) wells.
+
+    Examples
+    --------
+    >>> get_reagent_wells(1, 0)  # 2 samples
+    ('A7', 'A8', 'A9')
+    """
+    row = 'ABCDEFGH'[cycle % 8]
+    column = (sample * sample_spacing) + int((cycle // cycle_period) * cycle_offset) + 1
+
+    return row + str(column), row + str(column + 1), row + str(column + 2)
+
+def get_cycle_workload(sample_cycles, total_cycles):
+    """
+    Split the samples into active, finishing and hydrating samples for each cycle.
+
+    Parameters
+    ----------
+    sample_cycles : dict
+        Number of cycles keyed by sample position, see `get_sample_cycles`.
+    total_cycles : int
+        Number of cycles of the run (the largest per-sample cycle count).
+
+    Returns
+    -------
+    dict
+        Keyed by cycle index (0-based) with the sample positions that
+        - 'active': run the cycle,
+        - 'finishing': finished in the previous cycle, get their final strip
+          and are hydrated from then on,
+        - 'hydrating': finished in an earlier cycle and are hydrated
+          throughout the cycle.
+    """
+    workload = {}
+
+    for cycle_idx in range(total_cycles):
+        workload[cycle_idx] = {
+            'active': [well for well, n in sample_cycles.items() if n > cycle_idx],
+            'finishing': [well for well, n in sample_cycles.items() if 0 < n == cycle_idx],
+            'hydrating': [well for well, n in sample_cycles.items() if n < cycle_idx],
+        }
+
+    return workload
+
+def get_dispense_seconds(volume, disp_rate=sample_flow_rate):
+    """Estimated duration (in seconds) of one aspiration, dispense and blow-out"""
+    return volume / (default_flow_rate * disp_rate) + pipetting_seconds
+
+def get_strip_seconds(n_samples):
+    """Estimated duration (in seconds) of one strip of `n_samples` samples, as timed by `run`"""
+    if n_samples == 0:
+        return 0
+    return (strip_delay_seconds + 2 * handling_seconds
+            + n_samples * 6 * get_dispense_seconds(wash_volume)
+            + n_samples * 6 * get_dispense_seconds(DMSO_volume, DMSO_flow_rate))
+
+def get_cycle_seconds(n_samples):
+    """Estimated duration (in seconds) of one cycle of `n_samples` samples including its strip, as timed by `run`"""
+    return (get_strip_seconds(n_samples) + cycle_delay_seconds + handling_seconds
+            + n_samples * (6 * handling_seconds
+                           + 2 * get_dispense_seconds(100)
+                           + 10 * get_dispense_seconds(wash_volume)
+                           + get_dispense_seconds(90)
+                           + 3 * get_dispense_seconds(25)))
+
+def get_rinse_seconds(n_samples):
+    """Estimated duration (in seconds) of one rinse of `n_samples` finished samples, as timed by `run`"""
+    return handling_seconds + n_samples * get_dispense_seconds(hydration_volume)
+
+def get_hydration_rinses(seconds, n_samples):
+    """
+    Maximal number of rinses of finished samples during `seconds` of estimated
+    protocol time, not counting the rinses themselves.
+
+    Rinses start at least `hydration_interval - hydration_margin` minutes apart
+    and each takes `get_rinse_seconds(n_samples)` of estimated protocol time.
+    """
+    due = (hydration_interval - hydration_margin) * 60
+    return math.floor(seconds / (due - get_rinse_seconds(n_samples))) + 1
+
+def get_cycle_buffer_volumes(samples):
+    """
+    Compute the buffer volumes (in ul) consumed in one cycle.
+
+    Parameters
+    ----------
+    samples : dict
+        Active, finishing and hydrating samples of the cycle, see `get_cycle_workload`.
+
+    Returns
+    -------
+    dict
+        Consumed volume keyed by buffer ('CODEX', 'Strip', 'TBS', 'Hydration').
+        The final strip of finishing samples uses `FINAL_STRIP_BUFFERS` and is
+        not included. 'Hydration' is the 1X CODEX buffer of the rinses of
+        finished samples, an upper bound from the estimated cycle duration.
+    """
+    n_active = len(samples['active'])
+    n_finishing = len(samples['finishing'])
+    n_hydrating = len(samples['hydrating'])
+
+    # Earlier finished samples are rinsed during the whole cycle, finishing samples after their final strip
+    cycle_seconds = get_cycle_seconds(n_active) + get_strip_seconds(n_finishing)
+    finished_seconds = cycle_seconds - get_strip_seconds(n_active) - get_strip_seconds(n_finishing)
+
+    return {
+        'CODEX': n_active * cycle_CODEX_volume,
+        'Strip': n_active * strip_Strip_volume,
+        'TBS': n_active * 2 * wash_volume,
+        'Hydration': hydration_volume * (
+            n_hydrating * get_hydration_rinses(cycle_seconds, n_hydrating + n_finishing)
+            + n_finishing * get_hydration_rinses(finished_seconds, n_hydrating + n_finishing)),
+    }
+
+def create_cycle_config(workload):
+    """
+    Dynamically generate the reservoir well configuration for the cycle workload.
+
+    A new CODEX or Strip buffer well is used whenever the buffer consumed by the
+    samples of a cycle would exceed the usable volume of the current well.
+
+    Parameters
+    ----------
+    workload : dict
+        Samples per cycle, see `get_cycle_workload`.
+
+    Returns
+    -------
+    dict
+        Configuration dictionary keyed by cycle index (0-based).
+    """
+    # Available wells in reservoirs
+    codex_wells = ['A1', 'A2', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8']
+    strip_wells = ['A1', 'A2', 'A3', 'A4']
+    tbs_well = 'A12'
+
+    config = {}
+    codex_idx = 0
+    strip_idx = 0
+    codex_used = 0
+    strip_used = 0
+
+    for cycle_idx in sorted(workload):
+        volumes = get_cycle_buffer_volumes(workload[cycle_idx])
+        codex_needed = volumes['CODEX']
+        strip_needed = volumes['Strip']
+
+        config[cycle_idx] = {}
+        pierce_list = []
+
+        # Check if CODEX buffer changes this cycle
+        if cycle_idx == 0 or codex_used + codex_needed > CODEX_well_volume:
+            config[cycle_idx]['CODEX'] = codex_wells[codex_idx]
+            codex_idx += 1
+            codex_used = 0
+            pierce_list.append('CODEX')
+        codex_used += codex_needed
+
+        # Check if Strip buffer changes this cycle
+        if cycle_idx == 0 or strip_used + strip_needed > Strip_well_volume:
+            config[cycle_idx]['Strip'] = strip_wells[strip_idx]
+            strip_idx += 1
+            strip_used = 0
+            pierce_list.append('Strip')
+        strip_used += strip_needed
+
+        # Add TBS and add it to pierce list on first cycle only
+        if cycle_idx == 0:
+            config[cycle_idx]['TBS'] = tbs_well
+            pierce_list.insert(0, 'TBS')
+
+        if pierce_list:
+            config[cycle_idx]['pierce'] = pierce_list
+
+    return config
+
 ########################## MAIN RUN FUNCTION #####################
 
 # protocol run function. the part after the colon lets your editor know
@@ -439,7 +717,10 @@ def validate_cycle_sample_compatibility(protocol, num_samples, num_cycles):
 def run(protocol: protocol_api.ProtocolContext):
 
     ###### VALIDATION CHECK FOR CYCLE/SAMPLE NUMBER #####
-    validate_cycle_sample_compatibility(protocol, num_samples, PASTA_cycles)
+    sample_cycles = get_sample_cycles(wellslist, Tyr_dilution_lib, PASTA_cycles)
+    total_cycles = max(sample_cycles.values())
+    validate_sample_cycles(protocol, sample_cycles, Tyr_dilution_lib, PASTA_cycles)
+    validate_cycle_sample_compatibility(protocol, num_samples, total_cycles)
 
     ###########################LABWARE SETUP#################################
     temp_mod = protocol.load_module(module_name="temperature module gen2", location=labwarePositions.reagent_plate)
@@ -472,85 +753,73 @@ def run(protocol: protocol_api.ProtocolContext):
         sample_chambers.append(par2.wells_by_name()[well])
 
     ############ IN-LINE FUNCTIONS ##############
-    def strip():
+    def strip(samples):
         protocol.comment("Initial Strip")
 
         mix(pipette_300, buffers.CODEX, 150, 5, keep_tip=True)
-        washSamples(pipette_300, buffers.CODEX, sample_chambers, wash_volume, 2)
+        hydrate_if_due(handling_seconds)
+        washSamples(pipette_300, buffers.CODEX, samples, wash_volume, 2, between_dispenses=hydrate_if_due)
 
         mix(pipette_300, buffers.Strip, 150, 5, keep_tip=True)
-        washSamples(pipette_300, buffers.Strip, sample_chambers, DMSO_volume, 3, DMSO_flow_rate, keep_tip=True)
-        protocol.delay(minutes=3, msg = "Incubating Strip 1")
-        washSamples(pipette_300, buffers.Strip, sample_chambers, DMSO_volume, 3, DMSO_flow_rate, keep_tip=True)
-        protocol.delay(minutes=3, msg = "Incubating Strip 2")
-        pipette_300.drop_tip()
-
-        washSamples(pipette_300, buffers.CODEX, sample_chambers, wash_volume, 2, keep_tip=True)
-        protocol.delay(seconds=30, msg = "Washing in 1XCODEX")
-        washSamples(pipette_300, buffers.CODEX, sample_chambers, wash_volume, 2)
-        protocol.delay(seconds=30, msg = "Washing in 1XCODEX")
-
-    
-    def create_cycle_config(num_samples, total_cycles):
-        """
-        Dynamically generate cycle configuration based on sample count.
-        
-        Parameters
-        ----------
-        num_samples : int
-            Number of samples (1, 2, 3, or 4).
-        total_cycles : int
-            Total number of cycles to run.
-        
-        Returns
-        -------
-        dict
-            Configuration dictionary keyed by cycle index (0-based).
-        """
-        if num_samples == 1:
-            codex_interval = 4
-            strip_interval = 8
-        elif num_samples == 2:
-            codex_interval = 2
-            strip_interval = 4
-        elif num_samples in [3, 4]:
-            codex_interval = 1
-            strip_interval = 2
-        
-        # Available wells in reservoirs
-        codex_wells = ['A1', 'A2', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8']
-        strip_wells = ['A1', 'A2', 'A3', 'A4']
-        tbs_well = 'A12'
-        
-        config = {}
-        codex_idx = 0
-        strip_idx = 0
-        
-        for cycle_idx in range(total_cycles):
-            config[cycle_idx] = {}
-            pierce_list = []
-            
-            # Check if CODEX buffer changes this cycle
-            if cycle_idx % codex_interval == 0:
-                config[cycle_idx]['CODEX'] = codex_wells[codex_idx]
-                codex_idx += 1
-                pierce_list.append('CODEX')
-            
-            # Check if Strip buffer changes this cycle
-            if cycle_idx % strip_interval == 0:
-                config[cycle_idx]['Strip'] = strip_wells[strip_idx]
-                strip_idx += 1
-                pierce_list.append('Strip')
-            
-            # Add TBS and add it to pierce list on first cycle only
-            if cycle_idx == 0:
-                config[cycle_idx]['TBS'] = tbs_well
-                pierce_list.insert(0, 'TBS')
-            
-            if pierce_list:
-                config[cycle_idx]['pierce'] = pierce_list
-        
-        return config
+        hydrate_if_due(handling_seconds)
+        washSamples(pipette_300, buffers.Strip, samples, DMSO_volume, 3, DMSO_flow_rate, keep_tip=True, between_dispenses=hydrate_if_due)
+        wait(minutes=3, msg = "Incubating Strip 1")
+        washSamples(pipette_300, buffers.Strip, samples, DMSO_volume, 3, DMSO_flow_rate, keep_tip=True, between_dispenses=hydrate_if_due)
+        wait(minutes=3, msg = "Incubating Strip 2")
+        if pipette_300.has_tip: pipette_300.drop_tip()
+
+        washSamples(pipette_300, buffers.CODEX, samples, wash_volume, 2, keep_tip=True, between_dispenses=hydrate_if_due)
+        wait(seconds=30, msg = "Washing in 1XCODEX")
+        washSamples(pipette_300, buffers.CODEX, samples, wash_volume, 2, between_dispenses=hydrate_if_due)
+        wait(seconds=30, msg = "Washing in 1XCODEX")
+
+    def final_strip(samples):
+        """Strip finished samples with the final strip buffers, keeping the cycle buffers."""
+        cycle_buffers = (buffers.CODEX, buffers.Strip)
+        buffers.CODEX = buffer_wells_Other[FINAL_STRIP_BUFFERS['CODEX']]
+        buffers.Strip = buffer_wells_Other[FINAL_STRIP_BUFFERS['Strip']]
+        strip(samples)
+        buffers.CODEX, buffers.Strip = cycle_buffers
+
+    # Finished samples are rinsed with the 1X CODEX buffer of the hydration mode every `hydration_interval` minutes.
+    # Rinses are timed on the estimated protocol time (see `get_cycle_seconds`) rather than the wall clock,
+    # the same estimate `get_cycle_buffer_volumes` budgets with, so simulation and run rinse identically.
+    hydration = Object()
+    hydration.samples = []
+    hydration.last = 0
+    hydration.clock = 0   # Estimated protocol time in seconds
+    hydration.buffer = buffer_wells_CODEX[HYDRATION_BUFFERS[0]]
+    hydration.pierced = False
+
+    def hydration_due_in():
+        return hydration.last + (hydration_interval - hydration_margin) * 60 - hydration.clock
+
+    def hydrate_if_due(seconds=0):
+        """Advance the estimated protocol time by `seconds` and rinse finished samples when due."""
+        hydration.clock += seconds
+        if not hydration.samples or hydration_due_in() > 0:
+            return
+
+        if pipette_300.has_tip: pipette_300.drop_tip()
+        protocol.comment("Hydrating finished samples: " + str(hydration.samples))
+        hydration.last = hydration.clock
+        if not hydration.pierced:
+            pierceSeal(pipette_300, hydration.buffer)
+            hydration.pierced = True
+        mix(pipette_300, hydration.buffer, 150, 5, keep_tip=True)
+        washSamples(pipette_300, hydration.buffer, hydration.samples, hydration_volume, 1)
+        hydration.clock += get_rinse_seconds(len(hydration.samples))
+
+    def wait(minutes=0, seconds=0, msg=None):
+        """Delay the protocol, interrupting the delay to hydrate finished samples when due."""
+        remaining = minutes * 60 + seconds
+        while remaining > 0:
+            hydrate_if_due()
+            step = min(remaining, max(1, hydration_due_in())) if hydration.samples else remaining
+            protocol.delay(seconds=step, msg=msg)
+            hydration.clock += step
+            remaining -= step
+        hydrate_if_due()
 
     def update_cycle_buffers(cycle, config):
         """
@@ -582,21 +851,27 @@ def run(protocol: protocol_api.ProtocolContext):
     
 
 
+
     #################PROTOCOL####################
 
     protocol.comment("Starting the PASTA protocol for samples:" + str(sample_chambers))
+    protocol.comment("Cycles per sample: " + str(sample_cycles))
 
     temp_mod.set_temperature(celsius=4)
 
-    for cycle in range(PASTA_cycles):
-        protocol.comment("Starting Cycle: " + str(cycle+1) + "/" + str(PASTA_cycles))
-        
-        # Generate config on first cycle
-        if cycle == 0:
-            CYCLE_CONFIG = create_cycle_config(num_samples, PASTA_cycles)
+    CYCLE_WORKLOAD = get_cycle_workload(sample_cycles, total_cycles)
+    CYCLE_CONFIG = create_cycle_config(CYCLE_WORKLOAD)
+
+    for cycle in range(total_cycles):
+        protocol.comment("Starting Cycle: " + str(cycle+1) + "/" + str(total_cycles))
         
-        current_row = black_96.rows()[cycle % 8]
-        cycle_jump = int(((cycle) // cycle_period) * cycle_offset)
+        # Samples still running this cycle (indices into wellslist) and finished samples
+        active = [sample for sample in range(num_samples) if wellslist[sample] in CYCLE_WORKLOAD[cycle]['active']]
+        active_chambers = [sample_chambers[sample] for sample in active]
+        finishing_chambers = [par2.wells_by_name()[well] for well in CYCLE_WORKLOAD[cycle]['finishing']]
+
+        # HRP-oligo, Tyramide oligo and diluent wells of each active sample
+        reagent_wells = {sample: [black_96.wells_by_name()[name] for name in get_reagent_wells(sample, cycle)] for sample in active}
         
         # Update buffers using generated config
         update_cycle_buffers(cycle, CYCLE_CONFIG)
@@ -604,105 +879,114 @@ def run(protocol: protocol_api.ProtocolContext):
 
         ## Initial Strip
         protocol.comment("Starting Strip")
-        strip()
+        strip(active_chambers)
+
+        ## Final Strip for samples that finished in the previous cycle, hydrated from then on
+        if finishing_chambers:
+            protocol.comment("Final Strip for finished samples: " + str(finishing_chambers))
+            final_strip(finishing_chambers)
+            if not hydration.samples:
+                hydration.last = hydration.clock
+            hydration.samples = hydration.samples + finishing_chambers
 
         #Staining oligo
         protocol.comment("Staining HRP Oligos")
 
         ##Pierce Seals
-        for sample in range(len(sample_chambers)):
-            well = (sample * sample_spacing) + cycle_jump
-            pierceSeal(pipette_300, current_row[well], keep_tip=False)
+        for sample in active:
+            HRP_well = reagent_wells[sample][0]
+            pierceSeal(pipette_300, HRP_well, keep_tip=False)
+            hydrate_if_due(handling_seconds)
         
         
         ##Mix wells
-        for sample in range(len(sample_chambers)):
-            well = (sample * sample_spacing) + cycle_jump
-            mix(pipette_300, current_row[well], 50, 5, keep_tip=False)
+        for sample in active:
+            HRP_well = reagent_wells[sample][0]
+            mix(pipette_300, HRP_well, 50, 5, keep_tip=False)
+            hydrate_if_due(handling_seconds)
 
         #Apply HRP oligos #1
-        for sample in range(len(sample_chambers)):
-            well = (sample * sample_spacing) + cycle_jump
-            apply_buffer(pipette_300, current_row[well], sample_chambers[sample], 100, keep_tip=False)
+        for sample in active:
+            HRP_well = reagent_wells[sample][0]
+            apply_buffer(pipette_300, HRP_well, sample_chambers[sample], 100, keep_tip=False)
+            hydrate_if_due(get_dispense_seconds(100))
 
         #Apply HRP oligos #2
-        for sample in range(len(sample_chambers)):
-            well = (sample * sample_spacing) + cycle_jump
-            apply_buffer(pipette_300, current_row[well], sample_chambers[sample], 100, keep_tip=False)
+        for sample in active:
+            HRP_well = reagent_wells[sample][0]
+            apply_buffer(pipette_300, HRP_well, sample_chambers[sample], 100, keep_tip=False)
+            hydrate_if_due(get_dispense_seconds(100))
         
         
-        protocol.delay(minutes=10, msg = "Hybridizing oligos")
+        wait(minutes=10, msg = "Hybridizing oligos")
 
         #Wash
         protocol.comment("CODEX Wash 1")
-        washSamples(pipette_300, buffers.CODEX, sample_chambers, wash_volume, 2, keep_tip=False)
-        protocol.delay(minutes=1, msg="Washing")
+        washSamples(pipette_300, buffers.CODEX, active_chambers, wash_volume, 2, keep_tip=False, between_dispenses=hydrate_if_due)
+        wait(minutes=1, msg="Washing")
         protocol.comment("CODEX Wash 2")
-        washSamples(pipette_300, buffers.CODEX, sample_chambers, wash_volume, 2, keep_tip=True)
-        protocol.delay(minutes=1, msg="Washing")
+        washSamples(pipette_300, buffers.CODEX, active_chambers, wash_volume, 2, keep_tip=True, between_dispenses=hydrate_if_due)
+        wait(minutes=1, msg="Washing")
         protocol.comment("TBS Wash")
         mix(pipette_300, buffers.TBS, 150, 5, keep_tip=True)
-        washSamples(pipette_300, buffers.TBS, sample_chambers, wash_volume, 2)
-        protocol.delay(minutes=1, msg="Washing")
+        hydrate_if_due(handling_seconds)
+        washSamples(pipette_300, buffers.TBS, active_chambers, wash_volume, 2, between_dispenses=hydrate_if_due)
+        wait(minutes=1, msg="Washing")
 
 
         #Applying Tyramide Oligo
         protocol.comment("TSA application")
         ##Pierce Seal
-        for sample in range(len(sample_chambers)):
-            Tyr_well = (sample * sample_spacing) + cycle_jump + 1
-            Diluent_well = (sample * sample_spacing) + cycle_jump + 2
-            pierceSeal(pipette_300, current_row[Tyr_well], keep_tip=False)
-            pierceSeal(pipette_300, current_row[Diluent_well], keep_tip=False)
+        for sample in active:
+            Tyr_well = reagent_wells[sample][1]
+            Diluent_well = reagent_wells[sample][2]
+            pierceSeal(pipette_300, Tyr_well, keep_tip=False)
+            pierceSeal(pipette_300, Diluent_well, keep_tip=False)
+            hydrate_if_due(2 * handling_seconds)
         
         ##Dilute Tyramide oligo
-        for sample in range(len(sample_chambers)):
-            Tyr_well = (sample * sample_spacing) + cycle_jump + 1
-            Diluent_well = (sample * sample_spacing) + cycle_jump + 2
+        for sample in active:
+            Tyr_well = reagent_wells[sample][1]
+            Diluent_well = reagent_wells[sample][2]
             sample_well_name = wellslist[sample]  # Get 'A2', 'A3', etc.
             dilution_factor = Tyr_dilution_lib[cycle + 1][sample_well_name]  # +1 for cycle number
-            Tyr_diluent_volume = 200 - (200 / dilution_factor)
-            dilute_and_apply_TSA(pipette_300, current_row[Tyr_well], current_row[Diluent_well], sample_chambers[sample], Tyr_diluent_volume, 90, keep_tip=False, apply=False)
+            Tyr_diluent_volume = TSA_volume - (TSA_volume / dilution_factor)
+            dilute_and_apply_TSA(pipette_300, Tyr_well, Diluent_well, sample_chambers[sample], Tyr_diluent_volume, 90, keep_tip=False, apply=False)
+            hydrate_if_due(2 * handling_seconds)
         
         ##Apply first TSA Batch
-        for sample in range(len(sample_chambers)):
-            Tyr_well = (sample * sample_spacing) + cycle_jump + 1
-            apply_buffer(pipette_300, current_row[Tyr_well], sample_chambers[sample], 90, keep_tip=False)
+        for sample in active:
+            Tyr_well = reagent_wells[sample][1]
+            apply_buffer(pipette_300, Tyr_well, sample_chambers[sample], 90, keep_tip=False)
+            hydrate_if_due(get_dispense_seconds(90))
         
         for i in range(0,3):
-            protocol.delay(minutes=2, msg="Tyramide application")
-            for sample in range(len(sample_chambers)):
-                Tyr_well = (sample * sample_spacing) + cycle_jump + 1
-                apply_buffer(pipette_300, current_row[Tyr_well], sample_chambers[sample], 25, keep_tip=False)
+            wait(minutes=2, msg="Tyramide application")
+            for sample in active:
+                Tyr_well = reagent_wells[sample][1]
+                apply_buffer(pipette_300, Tyr_well, sample_chambers[sample], 25, keep_tip=False)
+                hydrate_if_due(get_dispense_seconds(25))
 
-        protocol.delay(minutes=10, msg = "Final TSA Incubation")
+        wait(minutes=10, msg = "Final TSA Incubation")
 
         #Wash
         protocol.comment("CODEX Wash 1")
-        washSamples(pipette_300, buffers.CODEX, sample_chambers, wash_volume, 2, keep_tip=False)
-        protocol.delay(minutes=1, msg="Washing")
+        washSamples(pipette_300, buffers.CODEX, active_chambers, wash_volume, 2, keep_tip=False, between_dispenses=hydrate_if_due)
+        wait(minutes=1, msg="Washing")
         protocol.comment("CODEX Wash 2")
-        washSamples(pipette_300, buffers.CODEX, sample_chambers, wash_volume, 2, keep_tip=False)
-        protocol.delay(minutes=1, msg="Washing")
+        washSamples(pipette_300, buffers.CODEX, active_chambers, wash_volume, 2, keep_tip=False, between_dispenses=hydrate_if_due)
+        wait(minutes=1, msg="Washing")
 
     protocol.comment("Turning off the temperature module.")
     temp_mod.deactivate()
 
     protocol.comment("Final Strip")
-    buffers.CODEX = buffer_wells_Other['A8']
-    buffers.Strip = buffer_wells_Other['A7']
-    strip()
+    final_strip([sample_chambers[sample] for sample in range(num_samples) if sample_cycles[wellslist[sample]] == total_cycles])
+    hydration.samples = []
 
     protocol.comment("Protocol Completed! Entering Hydration mode for " + str(hydration_time) + "hours.")
 
     #Hydration: Adding fresh CODEX buffer every 15 minutes
-    HYDRATION_BUFFERS = {
-        0: 'A9',
-        6: 'A10',
-        12: 'A11',
-        18: 'A12'
-    }
-
     for i in range(hydration_time * 4):
         cycle_hour = i // 4
         protocol.comment(f"Adding liquid as part of hydration cycle {i+1}/{hydration_time*4}")
@@ -712,5 +996,5 @@ def run(protocol: protocol_api.ProtocolContext):
             pierceSeal(pipette_300, buffers.CODEX)
         
         mix(pipette_300, buffers.CODEX, 150, 5, keep_tip=True)
-        washSamples(pipette_300, buffers.CODEX, sample_chambers, 100, 1, keep_tip=True)
+        washSamples(pipette_300, buffers.CODEX, sample_chambers, hydration_volume, 1, keep_tip=True)
         protocol.delay(minutes=15)
\ No newline at end of file
@@ -0,0 +1,567 @@
+"""
+Rendering benchmark for the phenotype maps of PASTA_Fig2_PhenotypeMaps.ipynb.
+
+Generates synthetic MESMER-like segmentation masks with matching annotation
+tables and times/memory-profiles every stage of `plot_phenotype`:
+
+- CSV load and TMA/core filter
+- MESMER mask load
+- `np.unique` on the mask
+- annotation dict building
+- membership checks between mask labels and annotation labels
+- `create_rgb_annotation` with boundaries
+- saving the full view and a crop view
+
+Results are written as JSON so that rendering changes can be compared against
+a previous run with `--compare`.
+
+Usage
+-----
+    python paper_figures/benchmarks/bench_phenotype_maps.py
+    python paper_figures/benchmarks/bench_phenotype_maps.py --cases 2048:10000 --repeat 3
+    python paper_figures/benchmarks/bench_phenotype_maps.py --compare ./output/benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import math
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import tifffile
+
+from wrplot.segmentation import (
+    create_rgb_annotation
+)
+from wrplot.utils import ax_plot_rgb_with_scalebar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+#################### BENCHMARK PARAMETERS #########################
+
+# (mask edge length in px, number of cells) - the largest case is tonsil-scale
+DEFAULT_CASES = [
+    (2048, 10_000),
+    (8192, 100_000),
+    (16384, 500_000),
+]
+
+# Same palette as in PASTA_Fig2_PhenotypeMaps.ipynb
+color_dict_complete = {
+    "CD4T": "#E41A1C",
+    "CD8T": "#377EB8",
+    "Treg": "#4DAF4A",
+    "NK": "#984EA3",
+    "DC": "#999999",
+    "M1": "#FFFF33",
+    "M2": "#A65628",
+    "B": "#66C2A5",
+    "Tumor": "#FC8D62"
+}
+
+# Fraction of the annotation table that is not part of the benchmarked core
+OTHER_CORE_FRACTION = 0.5
+# Fraction of mask labels without a row in the annotation table
+MISSING_ANNOTATION_FRACTION = 0.01
+# Fraction of annotated cells with a class outside color_dict ("Others")
+UNKNOWN_CLASS_FRACTION = 0.05
+
+# Crop view settings used for most panels in the notebook
+CROP_SIZE = 400
+CROP_PX = 1000
+DPI = 300
+
+# Rows of the mask generated at once (bounds temporary memory)
+MASK_BLOCK_ROWS = 512
+
+
+#################### SYNTHETIC DATA #########################
+
+def make_segmentation_mask(size, n_cells, seed=0):
+    """
+    Generate a synthetic MESMER-like label mask.
+
+    Cell centres are placed on a jittered grid and every pixel is assigned to
+    its nearest centre (a Voronoi tessellation), which gives packed polygonal
+    cells like whole-cell MESMER output. Pixels further than a per-cell radius
+    from their centre are set to background (0).
+
+    Parameters
+    ----------
+    size : int
+        Edge length of the square mask in pixels.
+    n_cells : int
+        Approximate number of cells. The actual count is `n_grid ** 2` with
+        `n_grid = round(sqrt(n_cells))`.
+    seed : int, default=0
+        Seed for the random number generator.
+
+    Returns
+    -------
+    numpy.ndarray
+        int32 array of shape (size, size) with labels 1..n_grid**2 and 0 for
+        background.
+    """
+    rng = np.random.default_rng(seed)
+
+    n_grid = max(1, round(math.sqrt(n_cells)))
+    step = size / n_grid
+
+    centre_y = (np.arange(n_grid)[:, None] + rng.uniform(0.2, 0.8, (n_grid, n_grid))) * step
+    centre_x = (np.arange(n_grid)[None, :] + rng.uniform(0.2, 0.8, (n_grid, n_grid))) * step
+    radius_sq = (rng.uniform(0.45, 0.7, (n_grid, n_grid)) * step) ** 2
+    labels = np.arange(1, n_grid * n_grid + 1, dtype=np.int32).reshape(n_grid, n_grid)
+
+    mask = np.empty((size, size), dtype=np.int32)
+    x = np.arange(size, dtype=np.float32)
+    grid_x = np.minimum((x // step).astype(np.int64), n_grid - 1)
+
+    for y0 in range(0, size, MASK_BLOCK_ROWS):
+        y = np.arange(y0, min(y0 + MASK_BLOCK_ROWS, size), dtype=np.float32)
+        grid_y = np.minimum((y // step).astype(np.int64), n_grid - 1)
+
+        best_dist = np.full((len(y), size), np.inf, dtype=np.float32)
+        best_iy = np.zeros((len(y), size), dtype=np.int64)
+        best_ix = np.zeros((len(y), size), dtype=np.int64)
+
+        # The nearest jittered centre is always within the neighbouring grid cells
+        for dy in (-1, 0, 1):
+            iy = np.clip(grid_y + dy, 0, n_grid - 1)[:, None]
+            for dx in (-1, 0, 1):
+                ix = np.clip(grid_x + dx, 0, n_grid - 1)[None, :]
+                dist = (y[:, None] - centre_y[iy, ix]) ** 2 + (x[None, :] - centre_x[iy, ix]) ** 2
+                closer = dist < best_dist
+                best_dist[closer] = dist[closer]
+                best_iy = np.where(closer, iy, best_iy)
+                best_ix = np.where(closer, ix, best_ix)
+
+        block = labels[best_iy, best_ix]
+        block[best_dist > radius_sq[best_iy, best_ix]] = 0
+        mask[y0:y0 + len(y)] = block
+
+    return mask
+
+
+def make_annotation_table(labels, tma_name_old, core_name, seed=0):
+    """
+    Generate an annotation table matching a synthetic segmentation mask.
+
+    The table has the columns used by `plot_phenotype` (TMA, core, cell_id,
+    annotation). A fraction of the mask labels is left unannotated, some cells
+    get a class outside `color_dict_complete` and additional rows belong to
+    another core so that the TMA/core filter has work to do.
+
+    Parameters
+    ----------
+    labels : numpy.ndarray
+        Non-zero labels present in the mask.
+    tma_name_old : str
+        TMA name as stored in the annotation table ("A4" for PASTA).
+    core_name : str
+        Name of the benchmarked core.
+    seed : int, default=0
+        Seed for the random number generator.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Annotation table.
+    """
+    rng = np.random.default_rng(seed)
+    classes = np.array(list(color_dict_complete.keys()) + ["Unknown"])
+    class_p = np.full(len(classes), (1 - UNKNOWN_CLASS_FRACTION) / (len(classes) - 1))
+    class_p[-1] = UNKNOWN_CLASS_FRACTION
+
+    annotated = labels[rng.random(len(labels)) >= MISSING_ANNOTATION_FRACTION]
+    n_other = int(len(annotated) * OTHER_CORE_FRACTION / (1 - OTHER_CORE_FRACTION))
+
+    core_df = pd.DataFrame({
+        "TMA": tma_name_old,
+        "core": core_name,
+        "cell_id": np.char.add("c", annotated.astype(str)),
+        "annotation": rng.choice(classes, size=len(annotated), p=class_p),
+    })
+    other_df = pd.DataFrame({
+        "TMA": tma_name_old,
+        "core": "Other",
+        "cell_id": np.char.add("c", rng.integers(1, len(labels) + 1, n_other).astype(str)),
+        "annotation": rng.choice(classes, size=n_other, p=class_p),
+    })
+
+    return pd.concat([core_df, other_df], ignore_index=True)
+
+
+#################### MEASUREMENT #########################
+
+@contextmanager
+def measure(results, stage, trace):
+    """
+    Record wall time and (optionally) peak traced memory of a stage.
+
+    Parameters
+    ----------
+    results : dict
+        Dictionary the stage entry is written into.
+    stage : str
+        Name of the stage.
+    trace : bool
+        Whether tracemalloc is running. Peak memory is only recorded when
+        tracing, since tracing slows down allocation-heavy stages.
+    """
+    if trace:
+        tracemalloc.reset_peak()
+        start_mem = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+
+    entry = results.setdefault(stage, {})
+    entry.setdefault("seconds", []).append(elapsed)
+
+    if trace:
+        current_mem, peak_mem = tracemalloc.get_traced_memory()
+        entry["peak_mb"] = (peak_mem - start_mem) / 2**20
+        entry["retained_mb"] = (current_mem - start_mem) / 2**20
+
+
+def run_pipeline(anno_path, mask_path, tma_name, core_name, out_dir, results, trace, membership_sample):
+    """
+    Run the `plot_phenotype` stages once, recording each stage in `results`.
+
+    The stage bodies mirror `plot_phenotype` in PASTA_Fig2_PhenotypeMaps.ipynb.
+
+    Parameters
+    ----------
+    anno_path : Path
+        Path to the annotation CSV.
+    mask_path : Path
+        Path to the MESMER mask tiff.
+    tma_name : str
+        Name of the TMA (PASTA or CODEX).
+    core_name : str
+        Name of the core.
+    out_dir : Path
+        Directory the rendered figures are written to.
+    results : dict
+        Stage results, see `measure`.
+    trace : bool
+        Whether tracemalloc is running.
+    membership_sample : int
+        Maximum number of mask labels checked against the annotation labels.
+        The notebook checks `lab in unique_labels` against a numpy array, which
+        is quadratic in the cell count. Above this number a random sample is
+        timed and the stage time is extrapolated to all labels.
+    """
+    with measure(results, "csv_load_filter", trace):
+        anno_df = pd.read_csv(anno_path)
+
+        tma_name_old = "A4" if tma_name == "PASTA" else "A3"
+
+        subset = anno_df[
+            (anno_df["TMA"] == tma_name_old) &
+            (anno_df["core"] == core_name)
+        ].copy()
+
+        subset["label"] = subset["cell_id"].str.lstrip("c").astype(int)
+
+    with measure(results, "mask_load", trace):
+        segmentation_mask = tifffile.imread(mask_path)
+
+    with measure(results, "unique", trace):
+        unique_labels = np.unique(segmentation_mask)
+        unique_labels = unique_labels[unique_labels != 0]
+
+    with measure(results, "annotation_dict", trace):
+        subset["class"] = subset["annotation"].where(
+            subset["annotation"].isin(color_dict_complete.keys()),
+            other="Others",
+        )
+
+        annotation_dict = dict(zip(subset["label"], subset["class"]))
+
+    checked = annotation_dict
+    n_labels = len(annotation_dict)
+    if n_labels > membership_sample:
+        keys = list(annotation_dict)
+        sampled = np.random.default_rng(0).choice(n_labels, membership_sample, replace=False)
+        checked = {keys[i]: annotation_dict[keys[i]] for i in sampled}
+
+    with measure(results, "membership_filter", trace):
+        filtered_dict = {lab: cls for lab, cls in checked.items() if lab in unique_labels}
+
+    results["membership_filter"]["labels_checked"] = len(checked)
+    results["membership_filter"]["labels_total"] = n_labels
+    results["membership_filter"]["extrapolated"] = len(checked) < n_labels
+
+    if len(checked) < n_labels:
+        # Keep the downstream stages identical to a full run
+        label_set = set(unique_labels.tolist())
+        filtered_dict = {lab: cls for lab, cls in annotation_dict.items() if lab in label_set}
+    annotation_dict = filtered_dict
+
+    with measure(results, "missing_check", trace):
+        missing_in_ann = [lab for lab in unique_labels if lab not in annotation_dict]
+
+    results["missing_check"]["missing_in_annotation"] = len(missing_in_ann)
+
+    with measure(results, "create_rgb_annotation", trace):
+        rgb_annotation = create_rgb_annotation(
+            segmentation_mask,
+            annotation_dict,
+            color_dict_complete,
+            boundary=True,
+        )
+
+    with measure(results, "save_full", trace):
+        fig, ax = plt.subplots(1, 1, figsize=(10, 10))
+
+        ax_plot_rgb_with_scalebar(
+            rgb_annotation,
+            mpp=0.5,
+            bar_width_um=0,
+            bar_height_perc=0.01,
+            text_to_bar_perc=0.01,
+            text_size=20,
+            ax=ax,
+            plot_text = False
+        )
+
+        ax.axis("off")
+        plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
+        plt.savefig(out_dir / "map_full.png", format="png", dpi=DPI, bbox_inches="tight", pad_inches=0)
+        plt.close(fig)
+
+    with measure(results, "save_crop", trace):
+        H, W = segmentation_mask.shape
+        y_min = (H - CROP_SIZE) // 2
+        x_min = (W - CROP_SIZE) // 2
+
+        fig, ax = plt.subplots(1, 1, figsize=(CROP_PX/DPI, CROP_PX/DPI), dpi=DPI)
+
+        ax_plot_rgb_with_scalebar(
+            rgb_annotation[y_min:y_min + CROP_SIZE, x_min:x_min + CROP_SIZE],
+            mpp=0.5,
+            bar_width_um=0,
+            bar_height_perc=0.01,
+            text_to_bar_perc=0.01,
+            text_size=20,
+            plot_text=False,
+            ax=ax,
+        )
+
+        ax.axis("off")
+        plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
+        plt.savefig(out_dir / "map_crop.png", format="png", dpi=DPI, bbox_inches="tight", pad_inches=0)
+        plt.close(fig)
+
+
+def summarize(results):
+    """
+    Reduce the repeated stage timings to min/median and extrapolate sampled stages.
+
+    Parameters
+    ----------
+    results : dict
+        Stage results, see `measure`.
+
+    Returns
+    -------
+    dict
+        Stage results with `seconds` replaced by `min_s` and `median_s`.
+    """
+    summary = {}
+    for stage, entry in results.items():
+        entry = dict(entry)
+        seconds = entry.pop("seconds")
+        entry["min_s"] = min(seconds)
+        entry["median_s"] = float(np.median(seconds))
+        entry["repeats"] = len(seconds)
+        if entry.get("extrapolated"):
+            scale = entry["labels_total"] / entry["labels_checked"]
+            entry["min_s"] *= scale
+            entry["median_s"] *= scale
+        summary[stage] = entry
+
+    summary["total"] = {
+        "min_s": sum(entry["min_s"] for entry in summary.values()),
+        "median_s": sum(entry["median_s"] for entry in summary.values()),
+    }
+    return summary
+
+
+def benchmark_case(size, n_cells, repeat, trace_memory, membership_sample, seed=0):
+    """
+    Generate the synthetic data for one case and benchmark all stages.
+
+    Parameters
+    ----------
+    size : int
+        Edge length of the square mask in pixels.
+    n_cells : int
+        Approximate number of cells.
+    repeat : int
+        Number of untraced timing runs.
+    trace_memory : bool
+        Whether to add one run under tracemalloc for peak memory per stage.
+    membership_sample : int
+        See `run_pipeline`.
+    seed : int, default=0
+        Seed for the synthetic data.
+
+    Returns
+    -------
+    dict
+        Case description and per-stage results.
+    """
+    tma_name = "PASTA"
+    core_name = "Synthetic"
+
+    print(f"Case {size}x{size} px, ~{n_cells} cells")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        mask_path = tmp / "mask.tiff"
+        anno_path = tmp / "annotation.csv"
+
+        start = time.perf_counter()
+        segmentation_mask = make_segmentation_mask(size, n_cells, seed)
+        unique_labels = np.unique(segmentation_mask)
+        unique_labels = unique_labels[unique_labels != 0]
+        tifffile.imwrite(mask_path, segmentation_mask)
+        make_annotation_table(unique_labels, "A4", core_name, seed).to_csv(anno_path, index=False)
+        del segmentation_mask
+        print(f"  Generated data in {time.perf_counter() - start:.1f} s")
+
+        results = {}
+        for i in range(repeat):
+            run_pipeline(anno_path, mask_path, tma_name, core_name, tmp, results, False, membership_sample)
+            print(f"  Timing run {i+1}/{repeat} done")
+
+        summary = summarize(results)
+
+        if trace_memory:
+            traced = {}
+            tracemalloc.start()
+            try:
+                run_pipeline(anno_path, mask_path, tma_name, core_name, tmp, traced, True, membership_sample)
+            finally:
+                tracemalloc.stop()
+            for stage, entry in traced.items():
+                summary[stage]["peak_mb"] = entry["peak_mb"]
+                summary[stage]["retained_mb"] = entry["retained_mb"]
+            print("  Memory run done")
+
+        return {
+            "size": size,
+            "n_cells_requested": n_cells,
+            "n_cells": int(len(unique_labels)),
+            "mask_mb": size * size * 4 / 2**20,
+            "csv_mb": anno_path.stat().st_size / 2**20,
+            "stages": summary,
+        }
+
+
+def compare(current, baseline_path):
+    """
+    Print per-stage time ratios of the current run against a baseline JSON.
+
+    Parameters
+    ----------
+    current : dict
+        Results of the current run.
+    baseline_path : str
+        Path to a JSON file written by a previous run.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    baseline_cases = {(case["size"], case["n_cells_requested"]): case for case in baseline["cases"]}
+
+    for case in current["cases"]:
+        key = (case["size"], case["n_cells_requested"])
+        if key not in baseline_cases:
+            print(f"{key[0]}px/{key[1]} cells: not in baseline")
+            continue
+        print(f"{key[0]}px/{key[1]} cells (current / baseline median time):")
+        for stage, entry in case["stages"].items():
+            old = baseline_cases[key]["stages"].get(stage)
+            if old is None or old["median_s"] == 0:
+                continue
+            print(f"  {stage:<22} {entry['median_s']:9.3f} s / {old['median_s']:9.3f} s = {entry['median_s'] / old['median_s']:.2f}x")
+
+
+def max_rss_mb():
+    """Peak resident memory of the process in MB, or None where `resource` is unavailable."""
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+def parse_case(text):
+    """Parse a `SIZE:CELLS` command line case."""
+    size, n_cells = text.split(":")
+    return int(size), int(n_cells)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the phenotype map rendering on synthetic masks.")
+    parser.add_argument("--cases", nargs="+", type=parse_case, default=DEFAULT_CASES,
+                        help="Cases as SIZE:CELLS, e.g. 2048:10000 8192:100000. Default: 2k, 8k and 16k px.")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of timing runs per case.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run per case.")
+    parser.add_argument("--membership-sample", type=int, default=20_000,
+                        help="Maximum number of labels for the membership check before extrapolating.")
+    parser.add_argument("--output", default="./output/benchmarks/phenotype_maps.json", help="JSON output path.")
+    parser.add_argument("--compare", help="Baseline JSON to compare the results against.")
+    args = parser.parse_args()
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "matplotlib": matplotlib.__version__,
+        "repeat": args.repeat,
+        "cases": [],
+    }
+
+    for size, n_cells in args.cases:
+        results["cases"].append(
+            benchmark_case(size, n_cells, args.repeat, not args.no_memory, args.membership_sample)
+        )
+
+    results["max_rss_mb"] = max_rss_mb()
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()